@@ -1,14 +1,24 @@
 import datetime as dt
+import hashlib
+import io
+import json
 import os
+import re
+import ssl
 import warnings
+from itertools import islice
+from pathlib import Path
+from typing import NamedTuple
 from urllib.parse import urljoin
-from zoneinfo import ZoneInfo
 
 import certifi
 import requests
-from bs4 import BeautifulSoup
-from requests.exceptions import SSLError
+import truststore
+from lxml import etree, html
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException, SSLError
 from urllib3.exceptions import InsecureRequestWarning
+from urllib3.util.retry import Retry
 
 BASE = "https://bincollection.northumberland.gov.uk"
 ENTRY_PATH = "/postcode"  # IMPORTANT: start here, not "/"
@@ -16,9 +26,25 @@ ENTRY_PATH = "/postcode"  # IMPORTANT: start here, not "/"
 # ========= USER SETTINGS =========
 POSTCODE = "NE18 0QP"
 ADDRESS_LABEL_MATCH = "The Bastle"
-WATCH_FOR = {"General"}  # e.g. {"General", "Recycling"}
+WATCH_FOR = frozenset({"General"})  # e.g. frozenset({"General", "Recycling"})
 # =================================
 
+# Precompiled XPath lookups for the few fields we need from each page
+_CSRF_VALUE = etree.XPath('//input[@name="_csrf"]/@value')
+_ADDRESS_SELECT = etree.XPath('//select[@name="address"]')
+_FORM_ACTION = etree.XPath("(//form)[1]/@action")
+
+# Dates on the schedule look like "25 February 2026"; parsed by hand rather than strptime("%B"),
+# which is slower and depends on the runner's locale. Keyed lowercase: like %B, matching ignores case.
+_MONTHS = {
+    name.lower(): i
+    for i, name in enumerate(
+        ["January", "February", "March", "April", "May", "June",
+         "July", "August", "September", "October", "November", "December"],
+        1,
+    )
+}
+
 # Telegram (set as env vars in PyCharm / GitHub Secrets)
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "")
@@ -29,15 +55,22 @@ FORCE_TEST_MESSAGE = os.getenv("FORCE_TEST_MESSAGE", "").strip().lower() in {"1"
 # Allow SSL verify=False fallback (default ON). Optional secret to disable: ALLOW_INSECURE_SSL_FALLBACK=0
 ALLOW_INSECURE_SSL_FALLBACK = os.getenv("ALLOW_INSECURE_SSL_FALLBACK", "1").strip().lower() in {"1", "true", "yes"}
 
+# Resolved address lookup (submit URL, address value, CSRF + session cookies), so steady-state runs
+# skip the postcode/address steps and only make the final schedule request
+CACHE = Path(__file__).with_name(".bin_cache.json")
+CACHE_MAX_AGE = dt.timedelta(days=30)
+_CACHE_KEYS = {"saved_at", "postcode", "label_match", "submit_url", "address_value", "csrf", "cookies"}
+
+# Last schedule response (validators, body hash, parsed collections) for conditional requests
+SCHEDULE_CACHE = Path(__file__).with_name(".schedule_cache.json")
+_CSRF_INPUT = re.compile(rb'(name="_csrf"\s+value=")([^"]*)')
+
 
-def should_run_now_on_github_actions() -> bool:
-    """Only enforce 7pm UK time for scheduled runs; allow manual runs anytime."""
-    if os.getenv("GITHUB_ACTIONS") != "true":
-        return True
-    if os.getenv("GITHUB_EVENT_NAME") != "schedule":
-        return True
-    now_uk = dt.datetime.now(ZoneInfo("Europe/London"))
-    return now_uk.hour == 19 and now_uk.minute < 15  # 19:00–19:14 window
+class Collection(NamedTuple):
+    type: str  # e.g. "General", "Recycling"
+    day: str  # weekday as shown on the page
+    date: dt.date
+    raw: str  # date text as shown on the page
 
 
 def send_telegram(message: str) -> None:
@@ -45,75 +78,132 @@ def send_telegram(message: str) -> None:
         raise RuntimeError("Missing TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID")
 
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    resp = requests.post(url, data={"chat_id": TELEGRAM_CHAT_ID, "text": message}, timeout=30)
+    resp = _HTTP.post(url, data={"chat_id": TELEGRAM_CHAT_ID, "text": message}, timeout=30)
     resp.raise_for_status()
 
 
-def build_reminder_message(due_bins: list[dict]) -> str:
+def build_reminder_message(due_bins: list[Collection]) -> str:
     if len(due_bins) == 1:
         b = due_bins[0]
         return (
             "🗑️ BIN DAY TOMORROW\n\n"
-            f"{b['type']} bin\n"
-            f"📅 {b['day']} {b['raw']}\n\n"
+            f"{b.type} bin\n"
+            f"📅 {b.day} {b.raw}\n\n"
             "Put it out tonight 👌"
         )
 
     lines = ["🗑️ BIN DAY TOMORROW", ""]
     for b in due_bins:
-        short = b["date"].strftime("%a %d %b")
-        lines.append(f"{b['type']} bin — {short}")
+        short = b.date.strftime("%a %d %b")
+        lines.append(f"{b.type} bin — {short}")
     lines.extend(["", "Put them out tonight 👌"])
     return "\n".join(lines)
 
 
-def get_csrf(soup: BeautifulSoup) -> str:
-    token = soup.select_one('input[name="_csrf"]')
-    if not token or not token.get("value"):
+def _parse(page: bytes) -> html.HtmlElement:
+    """Build the HTML tree for a council page (the one place that picks the parser)."""
+    return html.fromstring(page)
+
+
+def get_csrf(tree: html.HtmlElement) -> str:
+    values = _CSRF_VALUE(tree)
+    if not values or not values[0]:
         raise RuntimeError("Couldn't find CSRF token on page")
-    return token["value"]
+    return values[0]
+
 
+def _address_options(sel: html.HtmlElement):
+    for opt in sel.iter("option"):
+        value = (opt.get("value") or "").strip()
+        if value:
+            yield " ".join(opt.text_content().split()), value
 
-def select_address_option(soup: BeautifulSoup, label_match: str):
-    sel = soup.select_one('select[name="address"]')
+
+def select_address_option(tree: html.HtmlElement, label_match: str):
+    sel = _ADDRESS_SELECT(tree)
     if not sel:
         raise RuntimeError("Address dropdown not found")
 
-    needle = label_match.lower()
-    options = []
-    for opt in sel.select("option"):
-        value = (opt.get("value") or "").strip()
-        label = opt.get_text(" ", strip=True)
-        if value:
-            options.append((label, value))
-            if needle in label.lower():
-                return value, label
+    # Return on the first hit; the full option list is only built for the error message
+    matches = re.compile(re.escape(label_match), re.IGNORECASE).search
+    for label, value in _address_options(sel[0]):
+        if matches(label):
+            return value, label
 
     print("\nAvailable address options:")
-    for label, value in options:
+    for label, value in _address_options(sel[0]):
         print(f"- {label} (value={value})")
     raise RuntimeError("Address not matched — update ADDRESS_LABEL_MATCH.")
 
 
-def extract_next_collections(html: str) -> list[dict]:
-    soup = BeautifulSoup(html, "lxml")
+def extract_next_collections(page: bytes) -> list[Collection]:
+    """Stream-parse the schedule page, stopping once the row of bin cards has been read."""
     results = []
-    for card in soup.select("div.ncc-bin-calendar"):
-        ps = [p.get_text(strip=True) for p in card.find_all("p")]
-        if len(ps) < 3:
-            continue
-        bin_type, day, date_text = ps[:3]
-        try:
-            date_val = dt.datetime.strptime(date_text, "%d %B %Y").date()
-        except ValueError:
-            continue
-        results.append({"type": bin_type, "day": day, "date": date_val, "raw": date_text})
+    context = etree.iterparse(io.BytesIO(page), events=("end",), tag="div", html=True, recover=True)
+    try:
+        for _, el in context:
+            classes = (el.get("class") or "").split()
+            if "ncc-bin-row" in classes and results:
+                break
+            if "ncc-bin-calendar" not in classes:
+                continue
+            ps = ["".join(p.itertext()).strip() for p in islice(el.iter("p"), 3)]
+            el.clear(keep_tail=True)
+            if len(ps) < 3:
+                continue
+            bin_type, day, date_text = ps
+            try:
+                d, mon, y = date_text.split()
+                date_val = dt.date(int(y), _MONTHS[mon.lower()], int(d))
+            except (KeyError, ValueError):
+                continue
+            results.append(Collection(bin_type, day, date_val, date_text))
+    except etree.XMLSyntaxError:
+        # Blank/garbage page (e.g. the site blocking us): no elements at all to recover
+        pass
     return results
 
 
-def make_session() -> requests.Session:
+class _TruststoreAdapter(HTTPAdapter):
+    """Verifies against the OS trust store (plus certifi) through a dedicated context,
+    rather than truststore.inject_into_ssl() patching the global ssl module."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["ssl_context"] = truststore.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        super().init_poolmanager(*args, **kwargs)
+
+
+def make_session(verify: bool = True) -> requests.Session:
     s = requests.Session()
 
+    # Pooled keep-alive connections with backoff on transient errors. SSL errors ("other") aren't
+    # retried so the insecure fallback in _safe kicks in at once, and an exhausted status retry
+    # hands back the response so raise_for_status() raises HTTPError as usual.
+    adapter_cls = _TruststoreAdapter if verify else HTTPAdapter
+    adapter = adapter_cls(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(
+            total=3,
+            connect=3,
+            other=0,
+            backoff_factor=0.5,
+            status_forcelist=[500, 502, 503, 504, 429],
+            allowed_methods=["GET", "POST"],
+            raise_on_status=False,
+            # A WAF 429/503 can carry a Retry-After of hours; use our own short backoff instead
+            respect_retry_after_header=False,
+        ),
+    )
+    s.mount("https://", adapter)
+
+    # Telegram's sendMessage isn't idempotent: only retry connections that never got through,
+    # so a 5xx or dropped response can't send the reminder twice
+    s.mount(
+        "https://api.telegram.org/",
+        adapter_cls(max_retries=Retry(total=3, connect=3, read=0, other=0, backoff_factor=0.5)),
+    )
+
     # Browser-like headers (helps with WAF/bot filters)
     s.headers.update(
         {
@@ -128,113 +218,230 @@ def make_session() -> requests.Session:
         }
     )
 
-    # Try strict SSL first using certifi
-    s.verify = certifi.where()
-
-    # Cookie seen in their HTML anti-bot snippet
-    s.cookies.set("x-bni-ja", "1707374704", domain="bincollection.northumberland.gov.uk", path="/")
+    # Strict SSL using certifi; verify=False only for the insecure fallback session
+    s.verify = certifi.where() if verify else False
     return s
 
 
-def safe_get(s: requests.Session, url: str, **kwargs) -> requests.Response:
-    try:
-        r = s.get(url, **kwargs)
-        r.raise_for_status()
-        return r
-    except SSLError:
-        if not ALLOW_INSECURE_SSL_FALLBACK:
-            raise
-        print("⚠️ SSL verification failed for council site. Retrying with verify=False (insecure).")
-        warnings.simplefilter("ignore", InsecureRequestWarning)
-        r = s.get(url, verify=False, **kwargs)
-        r.raise_for_status()
-        return r
+# One shared session for Telegram + council calls, so the TCP/TLS handshake is reused
+_HTTP = make_session()
+
+# verify=False twin of _HTTP for the SSL fallback; shares its cookies
+_HTTP_INSECURE = make_session(verify=False)
+_HTTP_INSECURE.cookies = _HTTP.cookies
 
 
-def safe_post(s: requests.Session, url: str, **kwargs) -> requests.Response:
+def _safe(s: requests.Session, method: str, url: str, **kwargs) -> requests.Response:
+    """Transient failures are retried by the session's adapter; only SSL errors are handled here."""
     try:
-        r = s.post(url, **kwargs)
-        r.raise_for_status()
-        return r
+        r = s.request(method, url, **kwargs)
     except SSLError:
         if not ALLOW_INSECURE_SSL_FALLBACK:
             raise
         print("⚠️ SSL verification failed for council site. Retrying with verify=False (insecure).")
         warnings.simplefilter("ignore", InsecureRequestWarning)
-        r = s.post(url, verify=False, **kwargs)
-        r.raise_for_status()
-        return r
+        # verify=False per request too: a session-level verify is overridden by REQUESTS_CA_BUNDLE
+        r = _HTTP_INSECURE.request(method, url, verify=False, **kwargs)
+    r.raise_for_status()
+    return r
 
 
-def main():
-    if not should_run_now_on_github_actions():
-        print("Not within 7pm UK window — exiting (scheduled run).")
-        return
-
-    if FORCE_TEST_MESSAGE:
-        send_telegram("✅ Binchecker test: workflow ran and Telegram is working.")
-        print("Sent test message (FORCE_TEST_MESSAGE=1).")
-
-    s = make_session()
-
+def load_address_cache() -> dict | None:
+    """Return the cached address lookup if it matches the current settings and isn't stale."""
+    try:
+        data = json.loads(CACHE.read_text())
+        if not _CACHE_KEYS <= data.keys():
+            return None
+        saved_at = dt.datetime.fromisoformat(data["saved_at"])
+    except (OSError, ValueError, TypeError, AttributeError):
+        return None
+    if data.get("postcode") != POSTCODE or data.get("label_match") != ADDRESS_LABEL_MATCH:
+        return None
+    if dt.datetime.now(dt.timezone.utc) - saved_at > CACHE_MAX_AGE:
+        return None
+    return data
+
+
+def save_address_cache(s: requests.Session, submit_url: str, address_value: str, csrf: str) -> None:
+    # The CSRF token is tied to the session, so keep its cookies alongside it
+    cookies = [{"name": c.name, "value": c.value, "domain": c.domain, "path": c.path} for c in s.cookies]
+    data = {
+        "saved_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+        "postcode": POSTCODE,
+        "label_match": ADDRESS_LABEL_MATCH,
+        "submit_url": submit_url,
+        "address_value": address_value,
+        "csrf": csrf,
+        "cookies": cookies,
+    }
+    CACHE.write_text(json.dumps(data, indent=2))
+
+
+def lookup_address(s: requests.Session) -> tuple[str, str, str]:
+    """Steps 1 + 2: resolve POSTCODE/ADDRESS_LABEL_MATCH to (submit_url, address_value, csrf)."""
     # Step 1 — load ENTRY page for CSRF (use /postcode, not /)
     entry_url = f"{BASE}{ENTRY_PATH}"
-    r0 = safe_get(s, entry_url, timeout=30)
+    r0 = _safe(s, "GET", entry_url, timeout=30)
 
+    # Work on raw bytes throughout: the pages declare <meta charset="utf-8">, so the parser
+    # can decode them itself and we skip requests' charset detection on every response.
     # If the site is blocking automation, it may return a fake 404/blank page.
-    if r0.status_code == 404 or "Check your bin collection dates" not in r0.text:
+    if r0.status_code == 404 or b"Check your bin collection dates" not in r0.content:
         raise RuntimeError(
             "Council site appears to be blocking GitHub Actions (WAF/bot protection). "
             "This often shows as 404/validation pages from automated IPs. "
             "Best fix: run the script at home (cron/launchd/Raspberry Pi) or on a small VPS."
         )
 
-    soup0 = BeautifulSoup(r0.text, "lxml")
-    csrf0 = get_csrf(soup0)
+    csrf0 = get_csrf(_parse(r0.content))
 
     # Step 2 — submit postcode -> address select page
-    r1 = safe_post(
+    r1 = _safe(
         s,
+        "POST",
         f"{BASE}/postcode",
         data={"_csrf": csrf0, "postcode": POSTCODE},
         timeout=30,
         allow_redirects=True,
     )
-    soup1 = BeautifulSoup(r1.text, "lxml")
-    csrf1 = get_csrf(soup1)
+    tree1 = _parse(r1.content)
+    csrf1 = get_csrf(tree1)
 
-    form = soup1.find("form")
-    if not form or not form.get("action"):
+    action = _FORM_ACTION(tree1)
+    if not action or not action[0]:
         raise RuntimeError("Couldn't find address form/action")
-    submit_url = urljoin(BASE, form.get("action"))
+    submit_url = urljoin(BASE, action[0])
 
-    address_value, address_label = select_address_option(soup1, ADDRESS_LABEL_MATCH)
+    address_value, address_label = select_address_option(tree1, ADDRESS_LABEL_MATCH)
     print(f"Selected: {address_label}")
+    return submit_url, address_value, csrf1
+
 
-    # Step 3 — submit address -> schedule
-    r2 = safe_post(
+def load_schedule_snapshot(address_value: str) -> dict:
+    try:
+        data = json.loads(SCHEDULE_CACHE.read_text())
+    except (OSError, ValueError):
+        return {}
+    return data if data.get("address_value") == address_value else {}
+
+
+def save_schedule_snapshot(r: requests.Response, address_value: str, digest: str, collections: list[Collection]) -> None:
+    data = {
+        "address_value": address_value,
+        "etag": r.headers.get("ETag", ""),
+        "last_modified": r.headers.get("Last-Modified", ""),
+        "sha256": digest,
+        "collections": [{**c._asdict(), "date": c.date.isoformat()} for c in collections],
+    }
+    SCHEDULE_CACHE.write_text(json.dumps(data, indent=2))
+
+
+def snapshot_collections(snapshot: dict) -> list[Collection]:
+    return [Collection(**{**c, "date": dt.date.fromisoformat(c["date"])}) for c in snapshot["collections"]]
+
+
+def fetch_schedule(
+    s: requests.Session, submit_url: str, address_value: str, csrf: str
+) -> tuple[list[Collection], str]:
+    """Step 3: submit address -> schedule, parsed into collections.
+
+    Sends conditional headers from the last snapshot and skips parsing entirely on a 304 or when
+    the page content is unchanged. Also returns the page's fresh CSRF token (or ``csrf`` if none).
+    """
+    snapshot = load_schedule_snapshot(address_value)
+    headers = {}
+    if snapshot.get("etag"):
+        headers["If-None-Match"] = snapshot["etag"]
+    if snapshot.get("last_modified"):
+        headers["If-Modified-Since"] = snapshot["last_modified"]
+
+    r2 = _safe(
         s,
+        "POST",
         submit_url,
-        data={"_csrf": csrf1, "address": address_value},
+        data={"_csrf": csrf, "address": address_value},
+        headers=headers,
         timeout=30,
         allow_redirects=True,
     )
+    if r2.status_code == 304 and snapshot:
+        print("Schedule not modified — using cached collections.")
+        return snapshot_collections(snapshot), csrf
+
+    # The page embeds a fresh CSRF token each time, so mask it before comparing
+    m = _CSRF_INPUT.search(r2.content)
+    fresh_csrf = m.group(2).decode() if m and m.group(2) else csrf
+    digest = hashlib.sha256(_CSRF_INPUT.sub(rb"\1", r2.content)).hexdigest()
+    if snapshot and digest == snapshot.get("sha256"):
+        print("Schedule page unchanged — using cached collections.")
+        return snapshot_collections(snapshot), fresh_csrf
+
+    collections = extract_next_collections(r2.content)
+    if collections:
+        save_schedule_snapshot(r2, address_value, digest, collections)
+    return collections, fresh_csrf
+
+
+def check_bins(outbox: list[str]) -> None:
+    if FORCE_TEST_MESSAGE:
+        outbox.append("✅ Binchecker test: workflow ran and Telegram is working.")
+        print("Queued test message (FORCE_TEST_MESSAGE=1).")
+
+    s = _HTTP
+
+    # Fast path — reuse the cached address lookup and go straight to Step 3
+    collections = []
+    cached = load_address_cache()
+    if cached:
+        for cookie in cached["cookies"]:
+            s.cookies.set(**cookie)
+        try:
+            collections, csrf = fetch_schedule(s, cached["submit_url"], cached["address_value"], cached["csrf"])
+        except (RuntimeError, RequestException, etree.LxmlError) as e:
+            # A stale cache must never cost a reminder: anything going wrong here means full lookup
+            print(f"Cached address lookup failed ({e}) — doing full lookup.")
+        else:
+            if collections:
+                # Keep the cache current with any rotated cookies and the page's fresh CSRF token
+                save_address_cache(s, cached["submit_url"], cached["address_value"], csrf)
+            else:
+                print("Cached address lookup returned no collections — doing full lookup.")
+
+    if not collections:
+        s.cookies.clear()
+        # Cookie seen in their HTML anti-bot snippet (re-seeded every run)
+        s.cookies.set("x-bni-ja", "1707374704", domain="bincollection.northumberland.gov.uk", path="/")
+
+        submit_url, address_value, csrf = lookup_address(s)
+        collections, csrf = fetch_schedule(s, submit_url, address_value, csrf)
+        if collections:
+            save_address_cache(s, submit_url, address_value, csrf)
 
-    collections = extract_next_collections(r2.text)
     if not collections:
         print("Couldn't parse next collections from schedule page.")
         return
 
     tomorrow = dt.date.today() + dt.timedelta(days=1)
-    watched = [c for c in collections if c["type"] in WATCH_FOR]
-    due = [c for c in watched if c["date"] == tomorrow]
+    due = [c for c in collections if c.type in WATCH_FOR and c.date == tomorrow]
 
     if due:
-        send_telegram(build_reminder_message(due))
-        print("Reminder sent.")
+        outbox.append(build_reminder_message(due))
+        print("Reminder queued.")
     else:
         print("No watched bins due tomorrow.")
 
 
+def main():
+    # Everything for Telegram goes out as one sendMessage at the end (also if the scrape fails,
+    # so a forced test message still arrives)
+    outbox: list[str] = []
+    try:
+        check_bins(outbox)
+    finally:
+        if outbox:
+            send_telegram("\n\n---\n\n".join(outbox))
+            print(f"Sent {len(outbox)} message(s) to Telegram.")
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()